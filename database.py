@@ -1,5 +1,10 @@
+import atexit
+import contextlib
+import itertools
 import os
 import sqlite3
+import threading
+import weakref
 
 from datetime import datetime
 # 'time' import removed as it was only used for connection retries
@@ -9,218 +14,353 @@ from datetime import datetime
 # We only need a file path.
 DB_FILE = os.getenv('DB_FILE', 'vulnerable_bank.db')
 
-# Connection pooling is not typically used with SQLite in this manner.
-# We will create and close connections as needed.
+# How long SQLite's built-in busy handler waits on a locked database
+# before surfacing SQLITE_BUSY, in milliseconds.
+BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+
+# Bump this whenever init_db's DDL or seed data changes so existing
+# databases get re-initialized.
+# Version 2: money columns declared INTEGER instead of REAL. This only
+#   affects freshly created tables: CREATE TABLE IF NOT EXISTS cannot
+#   change existing declarations, so legacy databases keep REAL
+#   affinity (converting them would need a full table rebuild).
+# Version 3: covering indexes for the history views.
+SCHEMA_VERSION = 3
+
+# The full DDL as one script: a single executescript call hands the
+# whole blob to SQLite's parser at once instead of paying a prepare and
+# a Python<->C round-trip per statement.
+_SCHEMA_SQL = """
+    -- users
+    -- - SERIAL -> INTEGER PRIMARY KEY (alias for the rowid; AUTOINCREMENT
+    --   would add a sqlite_sequence write per insert for no benefit here)
+    -- - DECIMAL -> INTEGER (integer affinity packs whole amounts densely)
+    -- - BOOLEAN -> INTEGER
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,  -- Vulnerability: Passwords stored in plaintext
+        account_number TEXT NOT NULL UNIQUE,
+        balance INTEGER DEFAULT 1000,
+        is_admin INTEGER DEFAULT 0, -- 0 for FALSE
+        profile_picture TEXT,
+        reset_pin TEXT  -- Vulnerability: Reset PINs stored in plaintext
+    );
+
+    CREATE TABLE IF NOT EXISTS loans (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        amount INTEGER,
+        status TEXT DEFAULT 'pending'
+    );
+
+    -- TIMESTAMP -> TEXT (common for CURRENT_TIMESTAMP)
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY,
+        from_account TEXT NOT NULL,
+        to_account TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        transaction_type TEXT NOT NULL,
+        description TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS virtual_cards (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        card_number TEXT NOT NULL UNIQUE,  -- Vulnerability: Card numbers stored in plaintext
+        cvv TEXT NOT NULL,  -- Vulnerability: CVV stored in plaintext
+        expiry_date TEXT NOT NULL,
+        card_limit INTEGER DEFAULT 1000,
+        current_balance INTEGER DEFAULT 0,
+        is_frozen INTEGER DEFAULT 0, -- 0 for FALSE
+        is_active INTEGER DEFAULT 1, -- 1 for TRUE
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TEXT,
+        card_type TEXT DEFAULT 'standard'  -- Vulnerability: No validation on card type
+    );
+
+    CREATE TABLE IF NOT EXISTS card_transactions (
+        id INTEGER PRIMARY KEY,
+        card_id INTEGER REFERENCES virtual_cards(id) ON DELETE CASCADE,
+        amount INTEGER NOT NULL,
+        merchant_name TEXT,  -- Vulnerability: No input validation
+        transaction_type TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        description TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS bill_categories (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT,
+        is_active INTEGER DEFAULT 1 -- 1 for TRUE
+    );
+
+    CREATE TABLE IF NOT EXISTS billers (
+        id INTEGER PRIMARY KEY,
+        category_id INTEGER REFERENCES bill_categories(id),
+        name TEXT NOT NULL,
+        account_number TEXT NOT NULL,  -- Vulnerability: No encryption
+        description TEXT,
+        minimum_amount INTEGER DEFAULT 0,
+        maximum_amount INTEGER,  -- Vulnerability: No validation
+        is_active INTEGER DEFAULT 1 -- 1 for TRUE
+    );
+
+    CREATE TABLE IF NOT EXISTS bill_payments (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        biller_id INTEGER REFERENCES billers(id),
+        amount INTEGER NOT NULL,
+        payment_method TEXT NOT NULL,  -- 'balance' or 'virtual_card'
+        card_id INTEGER REFERENCES virtual_cards(id),  -- NULL if paid with balance
+        reference_number TEXT,  -- Vulnerability: No unique constraint
+        status TEXT DEFAULT 'pending',
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        processed_at TEXT,
+        description TEXT
+    );
+
+    -- Index the foreign-key and account-number columns the app filters
+    -- on at runtime; without these, lookups on the unbounded
+    -- transactions/card_transactions tables are full scans. The
+    -- transactions and bill_payments indexes also carry the ordering
+    -- and amount columns, so history views
+    -- ('WHERE account=? ORDER BY timestamp DESC') are satisfied from
+    -- the index alone with no rowid lookback into the table.
+    CREATE INDEX IF NOT EXISTS idx_tx_from_time
+        ON transactions(from_account, timestamp DESC, amount);
+    CREATE INDEX IF NOT EXISTS idx_tx_to_time
+        ON transactions(to_account, timestamp DESC, amount);
+    CREATE INDEX IF NOT EXISTS idx_billpay_user_time
+        ON bill_payments(user_id, created_at DESC, amount, status);
+    CREATE INDEX IF NOT EXISTS idx_cards_user ON virtual_cards(user_id);
+    CREATE INDEX IF NOT EXISTS idx_cardtx_card ON card_transactions(card_id);
+    CREATE INDEX IF NOT EXISTS idx_loans_user ON loans(user_id);
+    -- Superseded by the covering indexes above (same leftmost column)
+    DROP INDEX IF EXISTS idx_tx_from;
+    DROP INDEX IF EXISTS idx_tx_to;
+    DROP INDEX IF EXISTS idx_billpay_user;
+"""
+
+# Connection pooling is not typically used with SQLite.
+# Instead we keep one long-lived connection per thread: opening and
+# closing per call pays thread spin-up, page-cache warmup, and PRAGMA
+# re-parsing on every query, and throws away the mmap/page-cache wins
+# of the PRAGMAs below.
+# The registry holds weak references only: the sole strong reference
+# lives in the owning thread's local storage, so when a thread dies its
+# connection is garbage-collected (which closes the file descriptor)
+# instead of leaking one open connection per short-lived thread.
+_tls = threading.local()
+_all_connections = weakref.WeakSet()
+_all_connections_lock = threading.Lock()
+
+class _Connection(sqlite3.Connection):
+    """sqlite3.Connection subclass. The base type cannot be weakly
+    referenced; subclassing adds the __weakref__ slot the registry
+    above relies on."""
 
 def get_connection():
     """
-    Get a connection to the SQLite database.
-    Enables foreign key support.
+    Get this thread's connection to the SQLite database, creating it on
+    first access. Enables foreign key support and tunes SQLite for
+    fewer fsyncs and better read concurrency.
     """
+    conn = getattr(_tls, 'conn', None)
+    if conn is not None:
+        return conn
+    in_memory = DB_FILE == ':memory:' or os.getenv('TESTING') == '1'
     try:
-        conn = sqlite3.connect(DB_FILE)
+        # One connection per thread, so it is safe to drop the
+        # same-thread check. A bigger statement cache keeps the hot
+        # queries as prepared statements (bind+step only), and
+        # isolation_level=None puts us in autocommit mode so
+        # transactions are opened with explicit BEGIN rather than the
+        # driver's implicit-BEGIN heuristics.
+        conn = sqlite3.connect(
+            # cache=shared lets every thread see the same in-memory DB
+            'file::memory:?cache=shared' if in_memory else DB_FILE,
+            check_same_thread=False,
+            cached_statements=512,
+            isolation_level=None,
+            uri=in_memory,
+            factory=_Connection,
+        )
+        if in_memory:
+            # Test/CI databases are throwaway: skip the journal and
+            # fsyncs entirely
+            conn.execute("PRAGMA journal_mode = MEMORY;")
+            conn.execute("PRAGMA synchronous = OFF;")
+        else:
+            # WAL lets readers run while a writer commits, and with
+            # synchronous=NORMAL each commit needs only one fdatasync.
+            # journal_mode and mmap_size are persistent per DB file, but
+            # re-issuing them per connection is harmless.
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("PRAGMA synchronous = NORMAL;")
+            conn.execute("PRAGMA mmap_size = 268435456;")  # 256 MB
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute("PRAGMA cache_size = -64000;")  # 64 MB page cache
+        # Let SQLite's C-level busy handler wait out transient
+        # SQLITE_BUSY from concurrent writers instead of raising
+        # immediately and forcing Python-side sleep/retry loops
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
         conn.execute("PRAGMA foreign_keys = ON;")
+        _tls.conn = conn
+        _tls.cursor = conn.cursor()
+        with _all_connections_lock:
+            _all_connections.add(conn)
         return conn
     except Exception as e:
         print(f"Failed to connect to SQLite database at {DB_FILE}: {e}")
         raise e
 
+def get_cursor():
+    """
+    Get this thread's long-lived cursor, creating the connection if
+    needed. Reusing one cursor keeps prepared statements warm in the
+    connection's statement cache.
+    """
+    get_connection()
+    return _tls.cursor
+
 def return_connection(connection):
     """
-    Close the SQLite connection.
+    Release the connection back to its owning thread.
+    The connection stays open for reuse; we only roll back any
+    transaction a caller left dangling.
     """
     if connection:
-        connection.close()
+        connection.rollback()
+
+# Shared-cache in-memory databases use table-level locks, and
+# busy_timeout only covers SQLITE_BUSY, not the SQLITE_LOCKED those
+# raise — concurrent access fails immediately with 'database table is
+# locked'. Serialize all access through one lock in that mode; the
+# file-backed WAL path needs no such gate.
+_shared_cache_lock = threading.Lock()
+
+def _serialization_guard():
+    if DB_FILE == ':memory:' or os.getenv('TESTING') == '1':
+        return _shared_cache_lock
+    return contextlib.nullcontext()
+
+@contextlib.contextmanager
+def db_connection():
+    """
+    Context manager pairing get_connection with return_connection.
+    If get_connection itself raises, there is no connection to release,
+    so callers never hit an unbound 'conn' in a finally block.
+    """
+    conn = get_connection()
+    with _serialization_guard():
+        try:
+            yield conn
+        finally:
+            return_connection(conn)
+
+def _close_all_connections():
+    """Close every still-open cached connection at interpreter shutdown.
+    Connections of threads that already died were closed by the GC and
+    are no longer in the registry."""
+    with _all_connections_lock:
+        conns = list(_all_connections)
+        _all_connections.clear()
+    for conn in conns:
+        try:
+            # Let SQLite refresh stale planner statistics while the
+            # connection still knows which indexes were queried
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        except Exception:
+            pass
+
+atexit.register(_close_all_connections)
 
 def init_db():
     """
     Initialize database tables
     Multiple vulnerabilities present for learning purposes
     """
-    conn = get_connection()
     try:
-        with conn: # Use 'with' to automatically handle commit/rollback
-            cursor = conn.cursor()
-            
-            # Create users table
-            # - SERIAL -> INTEGER PRIMARY KEY AUTOINCREMENT
-            # - DECIMAL -> REAL
-            # - BOOLEAN -> INTEGER
-            # - TEXT -> TEXT (unchanged)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password TEXT NOT NULL,  -- Vulnerability: Passwords stored in plaintext
-                    account_number TEXT NOT NULL UNIQUE,
-                    balance REAL DEFAULT 1000.0,
-                    is_admin INTEGER DEFAULT 0, -- 0 for FALSE
-                    profile_picture TEXT,
-                    reset_pin TEXT  -- Vulnerability: Reset PINs stored in plaintext
-                )
-            ''')
-            
-            # Create loans table
-            # - DECIMAL -> REAL
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS loans (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    amount REAL,
-                    status TEXT DEFAULT 'pending'
-                )
-            ''')
-            
-            # Create transactions table
-            # - DECIMAL -> REAL
-            # - TIMESTAMP -> TEXT (or INTEGER, but TEXT is common for CURRENT_TIMESTAMP)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    from_account TEXT NOT NULL,
-                    to_account TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                    transaction_type TEXT NOT NULL,
-                    description TEXT
-                )
-            ''')
-            
-            # Create virtual cards table
-            # - DECIMAL -> REAL
-            # - BOOLEAN -> INTEGER
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS virtual_cards (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    card_number TEXT NOT NULL UNIQUE,  -- Vulnerability: Card numbers stored in plaintext
-                    cvv TEXT NOT NULL,  -- Vulnerability: CVV stored in plaintext
-                    expiry_date TEXT NOT NULL,
-                    card_limit REAL DEFAULT 1000.0,
-                    current_balance REAL DEFAULT 0.0,
-                    is_frozen INTEGER DEFAULT 0, -- 0 for FALSE
-                    is_active INTEGER DEFAULT 1, -- 1 for TRUE
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    last_used_at TEXT,
-                    card_type TEXT DEFAULT 'standard'  -- Vulnerability: No validation on card type
-                )
-            ''')
-
-            # Create virtual card transactions table
-            # - DECIMAL -> REAL
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS card_transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    card_id INTEGER REFERENCES virtual_cards(id) ON DELETE CASCADE,
-                    amount REAL NOT NULL,
-                    merchant_name TEXT,  -- Vulnerability: No input validation
-                    transaction_type TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                    description TEXT
-                )
-            ''')
-            
+        with db_connection() as conn:
+            # Skip the DDL and seeding entirely on a warm database:
+            # even 'IF NOT EXISTS' no-ops still pay a prepare per statement
+            if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                return
+
+            # All DDL in one executescript call: one border crossing
+            # instead of ~14 prepares
+            conn.executescript(_SCHEMA_SQL)
+
+            cursor = get_cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+
             # Create default admin account if it doesn't exist
             # - Changed placeholder from %s to ?
             # - Changed boolean 'True' to integer 1
-            cursor.execute("SELECT * FROM users WHERE username='admin'")
+            cursor.execute("SELECT 1 FROM users WHERE username='admin' LIMIT 1")
             if not cursor.fetchone():
                 cursor.execute(
                     """
                     INSERT INTO users (username, password, account_number, balance, is_admin) 
                     VALUES (?, ?, ?, ?, ?)
                     """,
-                    ('admin', 'admin123', 'ADMIN001', 1000000.0, 1) # True -> 1
+                    ('admin', 'admin123', 'ADMIN001', 1000000, 1) # True -> 1
                 )
             # Create some user
-            cursor.execute("SELECT * FROM users WHERE username='alice'")
+            cursor.execute("SELECT 1 FROM users WHERE username='alice' LIMIT 1")
             if not cursor.fetchone():
                 cursor.execute(
                     """
                     INSERT INTO users (username, password, account_number, balance, is_admin) 
                     VALUES (?, ?, ?, ?, ?)
                     """,
-                    ('alice', 'password', '0869065552', 1250.0, 0)
+                    ('alice', 'password', '0869065552', 1250, 0)
                 )
-            cursor.execute("SELECT * FROM users WHERE username='bob'")
+            cursor.execute("SELECT 1 FROM users WHERE username='bob' LIMIT 1")
             if not cursor.fetchone():
                 cursor.execute(
                     """
                     INSERT INTO users (username, password, account_number, balance, is_admin) 
                     VALUES (?, ?, ?, ?, ?)
                     """,
-                    ('bob', 'password', '6955215471', 700.0, 0)
+                    ('bob', 'password', '6955215471', 700, 0)
                 )
-            
-            # Create bill categories table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS bill_categories (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE,
-                    description TEXT,
-                    is_active INTEGER DEFAULT 1 -- 1 for TRUE
-                )
-            ''')
-            # Create billers table
-            # - DECIMAL -> REAL
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS billers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category_id INTEGER REFERENCES bill_categories(id),
-                    name TEXT NOT NULL,
-                    account_number TEXT NOT NULL,  -- Vulnerability: No encryption
-                    description TEXT,
-                    minimum_amount REAL DEFAULT 0,
-                    maximum_amount REAL,  -- Vulnerability: No validation
-                    is_active INTEGER DEFAULT 1 -- 1 for TRUE
-                )
-            ''')
-
-            # Create bill payments table
-            # - DECIMAL -> REAL
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS bill_payments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    biller_id INTEGER REFERENCES billers(id),
-                    amount REAL NOT NULL,
-                    payment_method TEXT NOT NULL,  -- 'balance' or 'virtual_card'
-                    card_id INTEGER REFERENCES virtual_cards(id),  -- NULL if paid with balance
-                    reference_number TEXT,  -- Vulnerability: No unique constraint
-                    status TEXT DEFAULT 'pending',
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    processed_at TEXT,
-                    description TEXT
-                )
-            ''')
 
             # Insert default bill categories
-            # - ON CONFLICT syntax is compatible with SQLite
-            cursor.execute("""
-                INSERT INTO bill_categories (name, description) 
-                VALUES 
-                ('Utilities', 'Water, Electricity, Gas bills'),
-                ('Telecommunications', 'Phone, Internet, Cable TV'),
-                ('Insurance', 'Life, Health, Auto insurance'),
-                ('Credit Cards', 'Credit card bill payments')
-                ON CONFLICT (name) DO NOTHING
-            """)
+            # executemany prepares the statement once and binds each
+            # row, instead of reparsing a multi-row VALUES blob
+            cursor.executemany(
+                "INSERT OR IGNORE INTO bill_categories (name, description) VALUES (?, ?)",
+                [
+                    ('Utilities', 'Water, Electricity, Gas bills'),
+                    ('Telecommunications', 'Phone, Internet, Cable TV'),
+                    ('Insurance', 'Life, Health, Auto insurance'),
+                    ('Credit Cards', 'Credit card bill payments'),
+                ]
+            )
 
             # Insert sample billers
-            # - ON CONFLICT (id) DO NOTHING for SQLite to avoid errors on re-run
-            #   (Assuming name should be unique, but schema uses id. 
-            #   Using 'ON CONFLICT DO NOTHING' as in original)
-            cursor.execute("""
-                INSERT OR IGNORE INTO billers (category_id, name, account_number, description, minimum_amount) 
-                VALUES 
-                (1, 'City Water', 'WATER001', 'City Water Utility', 10),
-                (1, 'PowerGen Electric', 'POWER001', 'Electricity Provider', 20),
-                (2, 'TeleCom Services', 'TEL001', 'Phone and Internet', 25),
-                (2, 'CableTV Plus', 'CABLE001', 'Cable TV Services', 30),
-                (3, 'HealthFirst Insurance', 'INS001', 'Health Insurance', 100),
-                (4, 'Universal Bank Card', 'CC001', 'Credit Card Payments', 50)
-            """)
+            # - OR IGNORE to avoid errors on re-run
+            #   (Assuming name should be unique, but schema uses id)
+            cursor.executemany(
+                """
+                INSERT OR IGNORE INTO billers (category_id, name, account_number, description, minimum_amount)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [
+                    (1, 'City Water', 'WATER001', 'City Water Utility', 10),
+                    (1, 'PowerGen Electric', 'POWER001', 'Electricity Provider', 20),
+                    (2, 'TeleCom Services', 'TEL001', 'Phone and Internet', 25),
+                    (2, 'CableTV Plus', 'CABLE001', 'Cable TV Services', 30),
+                    (3, 'HealthFirst Insurance', 'INS001', 'Health Insurance', 100),
+                    (4, 'Universal Bank Card', 'CC001', 'Credit Card Payments', 50),
+                ]
+            )
 
             # Insert some data
             # - ON CONFLICT syntax is compatible with SQLite
@@ -248,48 +388,91 @@ def init_db():
             (1, 2, 500, 'approved')
             """)
 
-            # conn.commit() is handled by the 'with conn:' block
+            # Stamp the schema so subsequent init_db calls return early
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+            cursor.execute("COMMIT")
+
+            # Gather sqlite_stat1 data so the planner has row estimates
+            # for the joins across bill_payments -> billers -> bill_categories
+            cursor.execute("ANALYZE")
             print("Database initialized successfully")
-            
+
     except Exception as e:
         # Vulnerability: Detailed error information exposed
         print(f"Error initializing database: {e}")
-        # conn.rollback() is handled by the 'with conn:' block
         raise e
-    finally:
-        return_connection(conn)
 
-def execute_query(query, params=None, fetch=True):
+def execute_query(query, params=None, fetch=True, stream=False):
     """
     Execute a database query
     Vulnerability: This function still allows for SQL injection if called with string formatting
     - Changed placeholder logic for sqlite3
+    With stream=True the rows are not materialized up front: the caller
+    gets the cursor itself and iterates it lazily, calling .close() if
+    it stops early (or wrapping it in contextlib.closing for a with
+    block). Use for large result sets like transaction histories.
     """
-    conn = get_connection()
     try:
-        # Using 'with conn' ensures automatic commit on success or rollback on error
-        with conn:
-            cursor = conn.cursor()
-            
+        with db_connection() as conn:
+            if stream:
+                # A dedicated cursor, so later execute_query calls on this
+                # thread don't reset the iteration
+                cursor = conn.cursor()
+                cursor.execute(query, params if params else ())
+                return cursor
+
+            # Reuse the thread's cursor so the statement stays warm in the
+            # connection's statement cache; in autocommit mode a single
+            # statement commits on its own.
+            cursor = get_cursor()
+
             # Use empty tuple if params is None, as required by sqlite3
             cursor.execute(query, params if params else ())
-            
+
             result = None
             if fetch:
                 result = cursor.fetchall()
             return result
-            
-        # Note: The original's specific commit logic for INSERT/UPDATE/DELETE
-        # is now handled more robustly by the 'with conn:' context manager,
-        # which commits any changes if no exception occurs.
-            
+
     except Exception as e:
         # Vulnerability: Error details might be exposed to users
-        # Rollback is handled by 'with conn:'
         print(f"Error executing query: {e}") # Added print for clarity
         raise e
-    finally:
-        return_connection(conn)
+
+def execute_query_one(query, params=None):
+    """
+    Execute a query and return only its first row (or None).
+    Cheaper than execute_query for existence probes: no list is
+    allocated for what is effectively a boolean check.
+    """
+    try:
+        with db_connection() as conn:
+            cursor = get_cursor()
+            cursor.execute(query, params if params else ())
+            return cursor.fetchone()
+    except Exception as e:
+        print(f"Error executing query: {e}")
+        raise e
+
+def execute_many(query, seq_of_params):
+    """
+    Execute one query against a sequence of parameter tuples.
+    The statement is prepared once and the whole batch commits as a
+    single transaction (one fsync under WAL).
+    """
+    try:
+        with db_connection() as conn:
+            cursor = get_cursor()
+            # IMMEDIATE takes the write lock up front instead of on the
+            # first write, avoiding deferred->immediate upgrades that
+            # fail with SQLITE_BUSY under concurrent writers
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany(query, seq_of_params)
+            cursor.execute("COMMIT")
+    except Exception as e:
+        print(f"Error in batch execute: {e}")
+        raise e
 
 def execute_transaction(queries_and_params):
     """
@@ -297,18 +480,63 @@ def execute_transaction(queries_and_params):
     Vulnerability: No input validation on queries
     queries_and_params: list of tuples (query, params)
     - Placeholders are now '?' (handled in the query string itself)
+    Consecutive entries sharing the same query string are dispatched
+    through executemany so the statement is prepared once per group.
     """
-    conn = get_connection()
     try:
-        # 'with conn' manages the transaction (commit/rollback)
-        with conn:
-            cursor = conn.cursor()
-            for query, params in queries_and_params:
-                cursor.execute(query, params if params else ())
+        with db_connection() as conn:
+            # One explicit transaction so the whole batch commits with a
+            # single fsync
+            cursor = get_cursor()
+            # IMMEDIATE: take the write lock up front (see execute_many)
+            cursor.execute("BEGIN IMMEDIATE")
+            for query, group in itertools.groupby(queries_and_params, key=lambda qp: qp[0]):
+                params_seq = [params if params else () for _, params in group]
+                if len(params_seq) == 1:
+                    cursor.execute(query, params_seq[0])
+                else:
+                    cursor.executemany(query, params_seq)
+            cursor.execute("COMMIT")
     except Exception as e:
         # Vulnerability: Transaction rollback exposed
-        # Rollback handled by 'with conn'
         print(f"Error in transaction: {e}") # Added print for clarity
         raise e
-    finally:
-        return_connection(conn)
\ No newline at end of file
+
+# Tables (and their insertable columns) that bulk_copy may write to.
+# Unlike the query helpers above, this one interpolates identifiers into
+# SQL, so it is locked down to known schema objects.
+_BULK_COPY_TABLES = {
+    'transactions': ('from_account', 'to_account', 'amount', 'timestamp',
+                     'transaction_type', 'description'),
+    'card_transactions': ('card_id', 'amount', 'merchant_name',
+                          'transaction_type', 'status', 'timestamp',
+                          'description'),
+    'bill_payments': ('user_id', 'biller_id', 'amount', 'payment_method',
+                      'card_id', 'reference_number', 'status', 'created_at',
+                      'processed_at', 'description'),
+}
+
+def bulk_copy(src_query, dest_table, cols):
+    """
+    Copy rows into dest_table with a single INSERT ... SELECT.
+    All archival/migration flows should use this instead of looping
+    rows through execute_transaction: the copy happens entirely inside
+    SQLite, so no row ever crosses into Python.
+    src_query must be a SELECT producing one value per entry in cols.
+    """
+    allowed = _BULK_COPY_TABLES.get(dest_table)
+    if allowed is None:
+        raise ValueError(f"bulk_copy not allowed into table: {dest_table}")
+    if not cols or any(col not in allowed for col in cols):
+        raise ValueError(f"bulk_copy columns not allowed for {dest_table}: {cols}")
+    try:
+        with db_connection() as conn:
+            cursor = get_cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"INSERT INTO {dest_table} ({','.join(cols)}) {src_query}")
+            copied = cursor.rowcount
+            cursor.execute("COMMIT")
+            return copied
+    except Exception as e:
+        print(f"Error in bulk copy: {e}")
+        raise e
\ No newline at end of file